@@ -6,33 +6,124 @@ Suggests and adds wiki-links based on content analysis.
 Run with: uv run add_links.py [vault_path] [--dry-run]
 """
 
+import bisect
+import functools
+import heapq
+import os
 import re
 import sys
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
-def extract_existing_links(content: str) -> set[str]:
+# Compiled once at import — the per-file loops hit these constantly
+_WIKILINK_RE = re.compile(r'\[\[([^\]|]+)(?:\|[^\]]+)?\]\]')
+_RELATED_RE = re.compile(r'^## Related\s*$', re.MULTILINE)
+
+# MOC filename substrings mapped to vault domains (patterns are
+# already lowercase)
+_DOMAIN_PATTERNS = (
+    ("ideas", "thoughts"),
+    ("learnings", "thoughts"),
+    ("reflections", "thoughts"),
+    ("projects", "projects"),
+    ("goals", "goals"),
+)
+
+
+def extract_existing_links(content: str) -> frozenset[str]:
     """Extract existing [[wiki-links]] from content."""
-    pattern = r'\[\[([^\]|]+)(?:\|[^\]]+)?\]\]'
-    return set(re.findall(pattern, content))
+    return frozenset(_WIKILINK_RE.findall(content))
+
+
+def build_title_automaton(note_titles: set[str]):
+    """Build an Aho-Corasick automaton over all note titles (lowercased).
+
+    Returns None if pyahocorasick is not installed — callers fall back
+    to the per-title regex scan.
+    """
+    if ahocorasick is None:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for title in note_titles:
+        if len(title) < 3:  # Skip very short titles
+            continue
+        automaton.add_word(title.lower(), title)
+
+    if len(automaton) == 0:
+        # make_automaton() on an empty trie leaves it unfinalized and
+        # iter() would raise; let the regex fallback handle this vault
+        return None
+
+    automaton.make_automaton()
+    return automaton
+
 
+def _is_word_char(char: str) -> bool:
+    """Equivalent of regex \\w for the manual boundary check."""
+    return char.isalnum() or char == "_"
 
-def find_mentions(content: str, note_titles: set[str]) -> list[tuple[str, int]]:
-    """Find mentions of note titles in content without existing links."""
-    existing = extract_existing_links(content)
+
+@functools.lru_cache(maxsize=None)
+def _boundary_re(title_lower: str) -> re.Pattern[str]:
+    """Word-boundary pattern for one lowercased title, compiled once per run."""
+    return re.compile(rf'\b{re.escape(title_lower)}\b')
+
+
+@functools.lru_cache(maxsize=None)
+def _boundary_ci_re(title: str) -> re.Pattern[str]:
+    """Case-insensitive boundary pattern, for non-ASCII titles only.
+
+    ASCII titles skip IGNORECASE entirely by matching their lowercased
+    form against pre-lowered content; non-ASCII case folding isn't
+    guaranteed 1:1, so the engine handles those.
+    """
+    return re.compile(rf'\b{re.escape(title)}\b', re.IGNORECASE)
+
+
+def find_mentions(
+    content: str,
+    note_titles: set[str],
+    existing: frozenset[str],
+    skip: str | None = None,
+) -> list[tuple[str, int]]:
+    """Find mentions of note titles in content without existing links.
+
+    skip names the file's own title — comparing against it avoids
+    copying the title set for every file. Regex fallback for when
+    pyahocorasick is unavailable; the automaton path goes through
+    _batch_find_mentions instead.
+    """
     mentions = []
+    content_lower = content.lower()
 
     for title in note_titles:
-        if title in existing:
+        if title == skip:
             continue
         if len(title) < 3:  # Skip very short titles
             continue
 
-        # Case-insensitive search for title
-        pattern = rf'\b{re.escape(title)}\b'
-        for match in re.finditer(pattern, content, re.IGNORECASE):
-            mentions.append((title, match.start()))
+        # Cheap substring probe before any regex machinery — most titles
+        # simply don't occur in a given file
+        title_lower = title.lower()
+        if title_lower not in content_lower:
+            continue
+        if title in existing:
+            continue
+
+        if title.isascii():
+            # Pre-lowered on both sides — no per-step case folding
+            for match in _boundary_re(title_lower).finditer(content_lower):
+                mentions.append((title, match.start()))
+        else:
+            for match in _boundary_ci_re(title).finditer(content):
+                mentions.append((title, match.start()))
 
     return mentions
 
@@ -56,42 +147,112 @@ def build_moc_mapping(vault_path: Path) -> dict[str, str]:
     if moc_dir.exists():
         for moc_file in moc_dir.glob("*.md"):
             moc_name = moc_file.stem
-            # Map common domain patterns
-            domain_patterns = {
-                "ideas": "thoughts",
-                "learnings": "thoughts",
-                "reflections": "thoughts",
-                "projects": "projects",
-                "goals": "goals",
-            }
-            for pattern, domain in domain_patterns.items():
-                if pattern.lower() in moc_name.lower():
+            moc_lower = moc_name.lower()
+            for pattern, domain in _DOMAIN_PATTERNS:
+                if pattern in moc_lower:
                     mapping[domain] = moc_name
 
     return mapping
 
 
+def _walk_md(root: Path):
+    """Yield markdown files under root, pruning hidden dirs at scandir level.
+
+    Unlike rglob, this never descends into .claude/.git/etc., so their
+    subtrees cost nothing.
+    """
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.md'):
+                    yield Path(entry.path)
+
+
+def _read_note(md_file: Path) -> str:
+    """Read one note's content (runs on a worker thread)."""
+    return md_file.read_text(encoding="utf-8", errors="ignore")
+
+
+def _batch_find_mentions(
+    contents: list[str],
+    automaton,
+) -> list[list[tuple[str, int]]]:
+    """Run one automaton pass over all files joined by a NUL sentinel.
+
+    Returns per-file lists of (title, position) hits, unfiltered —
+    the caller drops self-references and already-linked titles.
+    """
+    lowered = [content.lower() for content in contents]
+    offsets = []
+    pos = 0
+    for text in lowered:
+        offsets.append(pos)
+        pos += len(text) + 1  # +1 for the sentinel
+    buf = "\x00".join(lowered)
+
+    mentions: list[list[tuple[str, int]]] = [[] for _ in contents]
+    for end_idx, title in automaton.iter(buf):
+        file_idx = bisect.bisect_right(offsets, end_idx) - 1
+        file_start = offsets[file_idx]
+        start = end_idx - len(title) + 1
+        if start < file_start:
+            continue  # match straddles the sentinel
+        # Manual word-boundary check; the NUL sentinel is a non-word char
+        if start > 0 and _is_word_char(buf[start - 1]):
+            continue
+        if end_idx + 1 < len(buf) and _is_word_char(buf[end_idx + 1]):
+            continue
+        mentions[file_idx].append((title, start - file_start))
+
+    return mentions
+
+
 def analyze_and_suggest(vault_path: Path) -> dict:
     """Analyze vault and suggest new links."""
     suggestions: dict[str, list[dict]] = defaultdict(list)
 
-    # Collect all note titles
-    md_files = list(vault_path.rglob("*.md"))
-    md_files = [
-        f for f in md_files
-        if not any(part.startswith('.') for part in f.relative_to(vault_path).parts)
-    ]
+    # Collect all note titles (hidden dirs like .claude are pruned
+    # during the walk)
+    md_files = list(_walk_md(vault_path))
 
     note_titles = {f.stem for f in md_files}
     moc_mapping = build_moc_mapping(vault_path)
+    automaton = build_title_automaton(note_titles)
+
+    # Read files on a thread pool, analyze single-threaded
+    with ThreadPoolExecutor(
+        max_workers=min(32, (os.cpu_count() or 1) * 4)
+    ) as executor:
+        contents = list(executor.map(_read_note, md_files, chunksize=16))
+
+    batched = None
+    if automaton is not None and md_files:
+        batched = _batch_find_mentions(contents, automaton)
 
-    for md_file in md_files:
+    for idx, (md_file, content) in enumerate(zip(md_files, contents)):
         rel_path = md_file.relative_to(vault_path)
         title = md_file.stem
-        content = md_file.read_text(encoding="utf-8", errors="ignore")
+
+        # One regex sweep for existing links, shared by the mention
+        # filter and the MOC check below
+        existing_links = extract_existing_links(content)
 
         # Find unlinked mentions
-        mentions = find_mentions(content, note_titles - {title})
+        if batched is not None:
+            mentions = [
+                (mentioned, pos)
+                for mentioned, pos in batched[idx]
+                if mentioned != title and mentioned not in existing_links
+            ]
+        else:
+            mentions = find_mentions(
+                content, note_titles, existing_links, skip=title
+            )
         for mentioned_title, position in mentions:
             suggestions[title].append({
                 "type": "mention",
@@ -101,7 +262,6 @@ def analyze_and_suggest(vault_path: Path) -> dict:
             })
 
         # Suggest MOC links for orphan notes
-        existing_links = extract_existing_links(content)
         moc_suggestions = suggest_moc_links(rel_path, moc_mapping)
         for moc in moc_suggestions:
             if moc not in existing_links:
@@ -114,85 +274,95 @@ def analyze_and_suggest(vault_path: Path) -> dict:
     return dict(suggestions)
 
 
-def apply_link(file_path: Path, target: str, dry_run: bool = True) -> bool:
-    """Add a link to a note's related section."""
+def apply_links(file_path: Path, targets: list[str], dry_run: bool = True) -> int:
+    """Add links to a note's related section with a single read/write.
+
+    Returns the number of links added.
+    """
     content = file_path.read_text(encoding="utf-8")
 
-    # Check if link already exists
-    if f"[[{target}]]" in content:
-        return False
+    # Skip links that already exist (and duplicates within the batch)
+    new_targets = []
+    for target in targets:
+        if f"[[{target}]]" in content or target in new_targets:
+            continue
+        new_targets.append(target)
+
+    if not new_targets:
+        return 0
+
+    block = "\n".join(f"- [[{target}]]" for target in new_targets)
 
     # Find or create "Related" section
-    related_pattern = r'^## Related\s*$'
-    match = re.search(related_pattern, content, re.MULTILINE)
+    match = _RELATED_RE.search(content)
 
     if match:
-        # Add to existing Related section
-        insert_pos = match.end()
-        new_content = content[:insert_pos] + f"\n- [[{target}]]" + content[insert_pos:]
+        # Rewrite the matched heading line with the whole batch appended —
+        # one concatenation no matter how many targets
+        new_block = match.group(0) + "\n" + block
+        new_content = content[:match.start()] + new_block + content[match.end():]
     else:
         # Add Related section at end
-        new_content = content.rstrip() + f"\n\n## Related\n\n- [[{target}]]\n"
+        new_content = content.rstrip() + f"\n\n## Related\n\n{block}\n"
 
+    links = ", ".join(f"[[{target}]]" for target in new_targets)
     if dry_run:
-        print(f"[DRY RUN] Would add [[{target}]] to {file_path.name}")
-        return True
+        print(f"[DRY RUN] Would add {links} to {file_path.name}")
+        return len(new_targets)
 
     file_path.write_text(new_content, encoding="utf-8")
-    print(f"Added [[{target}]] to {file_path.name}")
-    return True
+    print(f"Added {links} to {file_path.name}")
+    return len(new_targets)
 
 
-def format_suggestions(suggestions: dict) -> str:
-    """Format suggestions as readable report."""
+def iter_suggestions(suggestions: dict):
+    """Yield readable report lines (streamed, never materialized)."""
     if not suggestions:
-        return "No link suggestions found. Vault is well-connected!"
+        yield "No link suggestions found. Vault is well-connected!"
+        return
 
-    lines = [
-        "# Link Suggestions",
-        "",
-        f"Found suggestions for {len(suggestions)} notes:",
-        "",
-    ]
+    yield "# Link Suggestions"
+    yield ""
+    yield f"Found suggestions for {len(suggestions)} notes:"
+    yield ""
 
     for note, items in sorted(suggestions.items()):
-        lines.append(f"## [[{note}]]")
+        yield f"## [[{note}]]"
         for item in items:
-            lines.append(f"- {item['type'].upper()}: Link to [[{item['target']}]]")
-            lines.append(f"  - Reason: {item['reason']}")
-        lines.append("")
-
-    return "\n".join(lines)
+            yield f"- {item['type'].upper()}: Link to [[{item['target']}]]"
+            yield f"  - Reason: {item['reason']}"
+        yield ""
 
 
-def format_html(suggestions: dict) -> str:
-    """Format suggestions as Telegram HTML."""
+def iter_html(suggestions: dict):
+    """Yield Telegram HTML report lines."""
     if not suggestions:
-        return "✅ <b>No link suggestions</b>\n\nVault is well-connected!"
+        yield "✅ <b>No link suggestions</b>"
+        yield ""
+        yield "Vault is well-connected!"
+        return
 
     total = sum(len(v) for v in suggestions.values())
 
-    lines = [
-        f"🔗 <b>Link Suggestions</b>",
-        "",
-        f"<b>Found:</b> {total} suggestions for {len(suggestions)} notes",
-        "",
-    ]
+    yield "🔗 <b>Link Suggestions</b>"
+    yield ""
+    yield f"<b>Found:</b> {total} suggestions for {len(suggestions)} notes"
+    yield ""
 
-    # Show top 10 suggestions
+    # Show top 10 suggestions (top-k pick, no full sort)
     count = 0
-    for note, items in sorted(suggestions.items(), key=lambda x: -len(x[1])):
-        if count >= 10:
-            remaining = total - count
-            lines.append(f"\n<i>... and {remaining} more suggestions</i>")
-            break
+    top_notes = heapq.nlargest(10, suggestions.items(), key=lambda x: len(x[1]))
+    for note, items in top_notes:
         for item in items:
-            lines.append(f"• [[{note}]] → [[{item['target']}]]")
+            yield f"• [[{note}]] → [[{item['target']}]]"
             count += 1
             if count >= 10:
                 break
+        if count >= 10:
+            break
 
-    return "\n".join(lines)
+    if count < total:
+        yield f"\n<i>... and {total - count} more suggestions</i>"
 
 
 def main():
@@ -217,30 +387,33 @@ def main():
     suggestions = analyze_and_suggest(vault_path)
 
     if apply_mode:
-        # Apply all suggestions
+        # Apply all suggestions; walk the vault once to resolve note
+        # paths instead of an rglob per note (first match wins, as before)
+        title_to_path: dict[str, Path] = {}
+        for md_file in _walk_md(vault_path):
+            title_to_path.setdefault(md_file.stem, md_file)
+
         applied = 0
         for note, items in suggestions.items():
-            note_path = vault_path / f"{note}.md"
-            # Try to find the actual file
-            matches = list(vault_path.rglob(f"{note}.md"))
-            matches = [m for m in matches if not str(m).startswith('.')]
-
-            if matches:
-                note_path = matches[0]
-                for item in items:
-                    if apply_link(note_path, item["target"], dry_run):
-                        applied += 1
+            note_path = title_to_path.get(note)
+            if note_path is not None:
+                targets = [item["target"] for item in items]
+                applied += apply_links(note_path, targets, dry_run)
 
         print(f"\n{'[DRY RUN] Would apply' if dry_run else 'Applied'} {applied} links")
     else:
-        # Just report
+        # Just report — stream lines straight to stdout instead of
+        # building the whole report in memory first
         if "--html" in sys.argv:
-            print(format_html(suggestions))
+            sys.stdout.writelines(line + "\n" for line in iter_html(suggestions))
         elif "--json" in sys.argv:
             import json
-            print(json.dumps(suggestions, indent=2))
+            json.dump(suggestions, sys.stdout, indent=2)
+            sys.stdout.write("\n")
         else:
-            print(format_suggestions(suggestions))
+            sys.stdout.writelines(
+                line + "\n" for line in iter_suggestions(suggestions)
+            )
 
 
 if __name__ == "__main__":
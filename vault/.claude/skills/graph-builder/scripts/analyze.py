@@ -6,16 +6,28 @@ Analyzes wiki-link structure and generates statistics.
 Run with: uv run analyze.py [vault_path]
 """
 
+import heapq
+import os
 import re
 import sys
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 
-def extract_links(content: str) -> list[str]:
-    """Extract [[wiki-links]] from content."""
-    pattern = r'\[\[([^\]|]+)(?:\|[^\]]+)?\]\]'
-    return re.findall(pattern, content)
+# Compiled once at import — hit for every file in the vault. A bytes
+# pattern so files can be scanned without decoding them first; the
+# bracket/pipe delimiters are ASCII and never occur inside UTF-8
+# multi-byte sequences.
+_WIKILINK_RE = re.compile(rb'\[\[([^\]|]+)(?:\|[^\]]+)?\]\]')
+
+
+def extract_links(content: bytes) -> list[str]:
+    """Extract [[wiki-links]] from raw note bytes."""
+    return [
+        link.decode("utf-8", errors="ignore")
+        for link in _WIKILINK_RE.findall(content)
+    ]
 
 
 def get_note_title(path: Path) -> str:
@@ -23,23 +35,73 @@ def get_note_title(path: Path) -> str:
     return path.stem
 
 
-def analyze_vault(vault_path: Path) -> dict:
-    """Analyze vault link structure."""
-    notes: dict[str, dict] = {}
-    links_from: dict[str, set] = defaultdict(set)  # note -> set of linked notes
-    links_to: dict[str, set] = defaultdict(set)    # note -> set of notes linking to it
+def _walk_md(root: Path):
+    """Yield (path, size) for markdown files under root, pruning hidden dirs.
 
-    # Collect all markdown files
-    md_files = list(vault_path.rglob("*.md"))
+    Unlike rglob, this never descends into .claude/.git/etc., so their
+    subtrees cost nothing. Sizes come from DirEntry.stat(), which reuses
+    metadata cached by the directory read instead of a fresh syscall.
+    """
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.md'):
+                    yield Path(entry.path), entry.stat().st_size
 
-    # Skip hidden directories and .claude
-    md_files = [
-        f for f in md_files
-        if not any(part.startswith('.') for part in f.relative_to(vault_path).parts)
-    ]
 
-    # Build note index
-    for md_file in md_files:
+def _scan_file(md_file: Path) -> list[str]:
+    """Read one note and extract its links (runs on a worker thread).
+
+    Reads raw bytes — only the matched link names get decoded, not the
+    whole file.
+    """
+    return extract_links(md_file.read_bytes())
+
+
+def analyze_vault(vault_path: Path, include_graph: bool = False) -> dict:
+    """Analyze vault link structure.
+
+    The full links_from/links_to mappings are only materialized when
+    include_graph is set — the report formatters never touch them.
+    """
+    notes: dict[str, dict] = {}
+
+    # Intern titles to small ints so the link graphs store int edges
+    # instead of hashing title strings per edge. Link targets may name
+    # notes that don't exist, so the table grows as titles appear.
+    title_id: dict[str, int] = {}
+    id_title: list[str] = []
+    links_from: list[set[int]] = []  # id -> ids of linked notes
+    links_to: list[set[int]] = []    # id -> ids of notes linking to it
+
+    def intern(title: str) -> int:
+        note_id = title_id.get(title)
+        if note_id is None:
+            note_id = len(id_title)
+            title_id[title] = note_id
+            id_title.append(title)
+            links_from.append(set())
+            links_to.append(set())
+        return note_id
+
+    # Collect all markdown files with their cached sizes (hidden dirs
+    # like .claude are pruned during the walk)
+    entries = list(_walk_md(vault_path))
+    md_files = [md_file for md_file, _ in entries]
+
+    # Read and scan files on a thread pool (I/O-bound; re releases the
+    # GIL while matching), then aggregate single-threaded.
+    with ThreadPoolExecutor(
+        max_workers=min(32, (os.cpu_count() or 1) * 4)
+    ) as executor:
+        scanned = list(executor.map(_scan_file, md_files, chunksize=16))
+
+    for (md_file, size), links in zip(entries, scanned):
         rel_path = md_file.relative_to(vault_path)
         title = get_note_title(md_file)
         domain = str(rel_path.parts[0]) if len(rel_path.parts) > 1 else "root"
@@ -47,26 +109,27 @@ def analyze_vault(vault_path: Path) -> dict:
         notes[title] = {
             "path": str(rel_path),
             "domain": domain,
-            "size": md_file.stat().st_size,
+            "size": size,
         }
 
-    # Analyze links
-    for md_file in md_files:
-        title = get_note_title(md_file)
-        content = md_file.read_text(encoding="utf-8", errors="ignore")
-
-        for link in extract_links(content):
+        src = intern(title)
+        for link in links:
             # Handle links with paths like [[folder/note]]
             link_title = link.split("/")[-1] if "/" in link else link
 
-            links_from[title].add(link_title)
-            links_to[link_title].add(title)
+            dst = intern(link_title)
+            links_from[src].add(dst)
+            links_to[dst].add(src)
 
-    # Calculate statistics
+    # Calculate per-note and per-domain statistics
+    # (incoming counts need the complete link graph, so this stays a
+    # separate pass — but it's a single one)
     orphans = []
+    domain_stats: dict[str, dict] = defaultdict(lambda: {"count": 0, "links": 0})
     for title, info in notes.items():
-        incoming = len(links_to.get(title, set()))
-        outgoing = len(links_from.get(title, set()))
+        note_id = title_id[title]
+        incoming = len(links_to[note_id])
+        outgoing = len(links_from[note_id])
         info["incoming"] = incoming
         info["outgoing"] = outgoing
         info["total_links"] = incoming + outgoing
@@ -77,9 +140,6 @@ def analyze_vault(vault_path: Path) -> dict:
             if info["domain"] not in ("MOC", "root"):
                 orphans.append(title)
 
-    # Domain statistics
-    domain_stats: dict[str, dict] = defaultdict(lambda: {"count": 0, "links": 0})
-    for title, info in notes.items():
         domain = info["domain"]
         domain_stats[domain]["count"] += 1
         domain_stats[domain]["links"] += info["total_links"]
@@ -89,107 +149,109 @@ def analyze_vault(vault_path: Path) -> dict:
         if count > 0:
             domain_stats[domain]["avg_links"] = domain_stats[domain]["links"] / count
 
-    # Most connected notes
-    most_connected = sorted(
-        notes.items(),
-        key=lambda x: x[1]["total_links"],
-        reverse=True
-    )[:10]
+    # Most connected notes — top-k without sorting the whole dict
+    most_connected = heapq.nlargest(
+        10, notes.items(), key=lambda x: x[1]["total_links"]
+    )
 
-    return {
+    stats = {
         "total_notes": len(notes),
-        "total_links": sum(len(v) for v in links_from.values()),
+        "total_links": sum(len(v) for v in links_from),
         "orphans": orphans,
         "orphan_count": len(orphans),
         "domain_stats": dict(domain_stats),
         "most_connected": [(t, n["total_links"]) for t, n in most_connected],
         "notes": notes,
-        "links_from": {k: list(v) for k, v in links_from.items()},
-        "links_to": {k: list(v) for k, v in links_to.items()},
     }
 
+    if include_graph:
+        stats["links_from"] = {
+            id_title[i]: [id_title[j] for j in edges]
+            for i, edges in enumerate(links_from)
+            if edges
+        }
+        stats["links_to"] = {
+            id_title[i]: [id_title[j] for j in edges]
+            for i, edges in enumerate(links_to)
+            if edges
+        }
+
+    return stats
 
-def format_report(stats: dict) -> str:
-    """Format analysis as readable report."""
-    lines = [
-        "# Vault Graph Analysis",
-        "",
-        "## Overview",
-        "",
-        f"- **Total notes:** {stats['total_notes']}",
-        f"- **Total links:** {stats['total_links']}",
-        f"- **Orphan notes:** {stats['orphan_count']}",
-        "",
-    ]
+
+def iter_report(stats: dict):
+    """Yield readable report lines (streamed, never materialized)."""
+    yield "# Vault Graph Analysis"
+    yield ""
+    yield "## Overview"
+    yield ""
+    yield f"- **Total notes:** {stats['total_notes']}"
+    yield f"- **Total links:** {stats['total_links']}"
+    yield f"- **Orphan notes:** {stats['orphan_count']}"
+    yield ""
 
     # Most connected
     if stats["most_connected"]:
-        lines.append("## Most Connected Notes")
-        lines.append("")
+        yield "## Most Connected Notes"
+        yield ""
         for title, count in stats["most_connected"][:5]:
-            lines.append(f"- [[{title}]] ({count} links)")
-        lines.append("")
+            yield f"- [[{title}]] ({count} links)"
+        yield ""
 
     # Domain stats
-    lines.append("## Domain Statistics")
-    lines.append("")
-    lines.append("| Domain | Notes | Avg Links |")
-    lines.append("|--------|-------|-----------|")
+    yield "## Domain Statistics"
+    yield ""
+    yield "| Domain | Notes | Avg Links |"
+    yield "|--------|-------|-----------|"
     for domain, data in sorted(stats["domain_stats"].items()):
         avg = data.get("avg_links", 0)
-        lines.append(f"| {domain}/ | {data['count']} | {avg:.1f} |")
-    lines.append("")
+        yield f"| {domain}/ | {data['count']} | {avg:.1f} |"
+    yield ""
 
     # Orphans
     if stats["orphans"]:
-        lines.append("## Orphan Notes (need links)")
-        lines.append("")
+        yield "## Orphan Notes (need links)"
+        yield ""
         for title in stats["orphans"][:20]:
             note = stats["notes"][title]
-            lines.append(f"- [[{title}]] ({note['domain']}/)")
+            yield f"- [[{title}]] ({note['domain']}/)"
         if len(stats["orphans"]) > 20:
-            lines.append(f"- ... and {len(stats['orphans']) - 20} more")
-        lines.append("")
+            yield f"- ... and {len(stats['orphans']) - 20} more"
+        yield ""
 
-    return "\n".join(lines)
 
-
-def format_html(stats: dict) -> str:
-    """Format analysis as Telegram HTML."""
+def iter_html(stats: dict):
+    """Yield Telegram HTML report lines."""
     orphan_count = stats["orphan_count"]
     orphan_emoji = "⚠️" if orphan_count > 10 else "✅"
 
-    lines = [
-        f"📊 <b>Vault Graph Analysis</b>",
-        "",
-        f"<b>📝 Total notes:</b> {stats['total_notes']}",
-        f"<b>🔗 Total links:</b> {stats['total_links']}",
-        f"<b>{orphan_emoji} Orphan notes:</b> {orphan_count}",
-        "",
-    ]
+    yield "📊 <b>Vault Graph Analysis</b>"
+    yield ""
+    yield f"<b>📝 Total notes:</b> {stats['total_notes']}"
+    yield f"<b>🔗 Total links:</b> {stats['total_links']}"
+    yield f"<b>{orphan_emoji} Orphan notes:</b> {orphan_count}"
+    yield ""
 
     # Most connected
     if stats["most_connected"]:
-        lines.append("<b>🏆 Most connected:</b>")
+        yield "<b>🏆 Most connected:</b>"
         for title, count in stats["most_connected"][:3]:
-            lines.append(f"• [[{title}]] ({count})")
-        lines.append("")
+            yield f"• [[{title}]] ({count})"
+        yield ""
 
     # Weakest domain
     weakest = min(
         stats["domain_stats"].items(),
         key=lambda x: x[1].get("avg_links", 0)
     )
-    lines.append(f"<b>⚡ Weakest domain:</b> {weakest[0]}/ (avg {weakest[1].get('avg_links', 0):.1f} links)")
+    yield f"<b>⚡ Weakest domain:</b> {weakest[0]}/ (avg {weakest[1].get('avg_links', 0):.1f} links)"
 
     # Orphan preview
     if stats["orphans"]:
-        lines.append("")
-        lines.append("<b>📋 Sample orphans:</b>")
+        yield ""
+        yield "<b>📋 Sample orphans:</b>"
         for title in stats["orphans"][:5]:
-            lines.append(f"• {title}")
-
-    return "\n".join(lines)
+            yield f"• {title}"
 
 
 def main():
@@ -203,16 +265,18 @@ def main():
         print(f"Error: Vault path not found: {vault_path}", file=sys.stderr)
         sys.exit(1)
 
-    stats = analyze_vault(vault_path)
+    stats = analyze_vault(vault_path, include_graph="--json" in sys.argv)
 
-    # Output format based on args
+    # Output format based on args — stream lines straight to stdout
+    # instead of building the whole report in memory first
     if "--html" in sys.argv:
-        print(format_html(stats))
+        sys.stdout.writelines(line + "\n" for line in iter_html(stats))
     elif "--json" in sys.argv:
         import json
-        print(json.dumps(stats, indent=2))
+        json.dump(stats, sys.stdout, indent=2)
+        sys.stdout.write("\n")
     else:
-        print(format_report(stats))
+        sys.stdout.writelines(line + "\n" for line in iter_report(stats))
 
 
 if __name__ == "__main__":